@@ -10,21 +10,81 @@ GEF Winter Challenge Dashboard - Fixed Version
 - Individual activity search
 """
 
+import io
 import os
+import gc
+import sys
+import csv
+import copy
 import pytz
 import json
+import hashlib
+import tempfile
+import time
 import logging
-from datetime import datetime, date
+import random
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, date, timedelta
+import numpy as np
 import pandas as pd
-from flask import Flask, render_template_string, jsonify
+from flask import (Flask, Blueprint, render_template_string, jsonify, request,
+                   Response, stream_with_context, g, abort)
+from openpyxl import Workbook
 from google.oauth2 import service_account
+from google.auth.credentials import AnonymousCredentials
 import gspread
+import requests
 
 SHEET_ID = os.environ.get(
     'SHEET_ID', '1PF9liQPShcqMPNBScmV1_V3kUFaZcmlIHy8TLM4AmJc')
 TIMEZONE = os.environ.get('TIMEZONE', 'Asia/Kolkata')
+# Point the Sheets client at another server, e.g. http://127.0.0.1:8900 for
+# the offline stand-in in sheets_stub.py
+GOOGLE_SHEETS_API_URL = 'https://sheets.googleapis.com'
+SHEETS_API_URL = os.environ.get('SHEETS_API_URL', '').rstrip('/')
 AUTO_REFRESH_SECONDS = int(os.environ.get('AUTO_REFRESH_SECONDS', '300'))
 START_DATE = date(2025, 11, 16)
+# Challenge served at / ; others from CHALLENGES_JSON live under /c/<slug>
+DEFAULT_CHALLENGE = os.environ.get('DEFAULT_CHALLENGE', 'winter')
+SNAPSHOT_MEMORY_LIMIT_MB = int(os.environ.get('SNAPSHOT_MEMORY_LIMIT_MB', '512'))
+# How long a prepared snapshot is served before SOURCE is fetched again
+SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get('SNAPSHOT_MAX_AGE_SECONDS', '60'))
+# After a failed load or refresh, wait this long before trying again
+SNAPSHOT_RETRY_SECONDS = int(os.environ.get('SNAPSHOT_RETRY_SECONDS', '30'))
+# TEAM DATA (roster and gender) changes rarely, so it is fetched less often
+TEAM_DATA_REFRESH_SECONDS = int(
+    os.environ.get('TEAM_DATA_REFRESH_SECONDS', '1800'))
+# Sheets API read quota is 60 requests per minute per user by default. This
+# is the budget of the whole deployment; each gunicorn worker gets its share
+SHEETS_REQUESTS_PER_MINUTE = int(
+    os.environ.get('SHEETS_REQUESTS_PER_MINUTE', '50'))
+SHEETS_MAX_RETRIES = int(os.environ.get('SHEETS_MAX_RETRIES', '4'))
+SHEETS_BACKOFF_BASE_SECONDS = float(
+    os.environ.get('SHEETS_BACKOFF_BASE_SECONDS', '1'))
+SHEETS_BACKOFF_MAX_SECONDS = float(
+    os.environ.get('SHEETS_BACKOFF_MAX_SECONDS', '32'))
+SHEETS_CIRCUIT_FAILURES = int(os.environ.get('SHEETS_CIRCUIT_FAILURES', '3'))
+SHEETS_CIRCUIT_RESET_SECONDS = int(
+    os.environ.get('SHEETS_CIRCUIT_RESET_SECONDS', '120'))
+# Rank movement is measured against the standings this many days ago
+RANK_CHANGE_DAYS = int(os.environ.get('RANK_CHANGE_DAYS', '1'))
+EXPORT_CHUNK_ROWS = 500
+EXPORT_CHUNK_BYTES = 64 * 1024
+XLSX_MIMETYPE = \
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Columns kept by normalize_source
+PREPARED_COLUMNS = ['athlete_id', 'athlete_name', 'team', 'date_parsed',
+                    'run_points', 'walk_points', 'ride_points', 'total_points']
+ACTIVITY_TYPES = [('Run', 'run_points'), ('Walk', 'walk_points'),
+                  ('Ride', 'ride_points')]
+LEADERBOARD_TITLES = {
+    'men_run': 'Men Run/Walk',
+    'women_run': 'Women Run/Walk',
+    'men_ride': 'Men Ride',
+    'women_ride': 'Women Ride'
+}
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('gef_dashboard')
@@ -36,7 +96,7 @@ MAIN_TEMPLATE = """<!doctype html>
 <head>
   <meta charset="utf-8">
   <meta name="viewport" content="width=device-width,initial-scale=1,maximum-scale=1,user-scalable=no">
-  <title>GEF Winter Challenge</title>
+  <title>{{ title }}</title>
   <style>
     *{margin:0;padding:0;box-sizing:border-box}
     html,body{height:100%;font-family:Inter,ui-sans-serif,system-ui,-apple-system,"Segoe UI",Roboto;font-size:16px}
@@ -62,6 +122,8 @@ MAIN_TEMPLATE = """<!doctype html>
     .search-mini::placeholder{color:#64748b;font-size:13px}
     
     .leaderboard-list{max-height:280px;overflow-y:auto;margin-top:10px}
+    .leaderboard-spacer{position:relative}
+    .leaderboard-spacer .athlete-item{position:absolute;left:0;right:0;height:44px;margin:0}
     .leaderboard-list::-webkit-scrollbar{width:6px}
     .leaderboard-list::-webkit-scrollbar-track{background:rgba(30,41,59,0.4);border-radius:10px}
     .leaderboard-list::-webkit-scrollbar-thumb{background:rgba(16,185,129,0.6);border-radius:10px}
@@ -71,6 +133,9 @@ MAIN_TEMPLATE = """<!doctype html>
     .athlete-rank{font-weight:800;color:#10b981;min-width:35px;font-size:16px}
     .athlete-name{flex:1;font-weight:600;font-size:15px;color:#e2e8f0}
     .athlete-points{font-weight:800;color:#3b82f6;font-size:16px}
+    .rank-change{margin-left:8px;font-size:12px;font-weight:800}
+    .rank-change.up{color:#10b981}
+    .rank-change.down{color:#ef4444}
     
     .rank-1{background:linear-gradient(90deg,rgba(251,191,36,0.3),rgba(15,23,42,0.5))}
     .rank-2{background:linear-gradient(90deg,rgba(203,213,225,0.3),rgba(15,23,42,0.5))}
@@ -109,6 +174,8 @@ MAIN_TEMPLATE = """<!doctype html>
     .refresh-btn:hover{transform:scale(1.1)}
     
     .no-result{color:#94a3b8;text-align:center;padding:30px;font-size:15px;font-weight:600}
+    .stale-notice{display:none;margin-top:8px;color:#fbbf24;font-size:13px;font-weight:700}
+    .stale-notice.visible{display:block}
     
     @media(min-width:768px){
       body{padding:24px;font-size:15px}
@@ -130,11 +197,12 @@ MAIN_TEMPLATE = """<!doctype html>
 <body>
   <div class="container">
     <div class="header">
-      <h1>🏃 GEF Winter Challenge</h1>
+      <h1>🏃 {{ title }}</h1>
       <p class="subtitle">Team Performance & Leaderboards</p>
       <p style="color:#64748b;font-size:13px;font-weight:600;margin-top:8px">
         Sheet Updated: <span id="sheetUpdated" style="color:#10b981;font-weight:700">—</span>
       </p>
+      <p id="staleNotice" class="stale-notice"></p>
     </div>
 
     <!-- Team Chart -->
@@ -217,38 +285,104 @@ MAIN_TEMPLATE = """<!doctype html>
   <button class="refresh-btn" onclick="loadData()">⟳</button>
 
   <script>
+    const BASE = {{ base|tojson }};
     let teamChartInstance = null;
     let allAthletes = [];
+    let athleteNames = [];
     let leaderboards = {};
+    let rankSince = '';
+    let lastVersion = null;
+    let chartTeams = [];
+    const sectionHashes = {};
+    const LEADERBOARD_LISTS = [
+      ['men_run', 'menRunList'],
+      ['women_run', 'womenRunList'],
+      ['men_ride', 'menRideList'],
+      ['women_ride', 'womenRideList']
+    ];
 
     async function loadData(){
       try{
-        const res = await fetch('/api/data');
-        const data = await res.json();
-        
-        allAthletes = data.athletes;
-        leaderboards = data.leaderboards;
-        
-        renderTeamChart(data.teams);
-        renderLeaderboard('menRunList', leaderboards.men_run, 'searchMenRun');
-        renderLeaderboard('womenRunList', leaderboards.women_run, 'searchWomenRun');
-        renderLeaderboard('menRideList', leaderboards.men_ride, 'searchMenRide');
-        renderLeaderboard('womenRideList', leaderboards.women_ride, 'searchWomenRide');
+        const res = await fetch(BASE + '/api/data');
+        applyData(await res.json());
+      }catch(e){
+        console.error('Failed to load data:', e);
+      }
+    }
+
+    function applyData(data){
+      try{
+        // Same snapshot content as last time: only the timestamps can differ
+        if(data.version !== lastVersion){
+          lastVersion = data.version;
+          allAthletes = data.athletes;
+          athleteNames = allAthletes.map(a => a.name.toLowerCase());
+          leaderboards = data.leaderboards;
+          rankSince = data.rank_baseline_at ? 'since ' + new Date(data.rank_baseline_at).toLocaleString() : '';
+          
+          if(sectionChanged('teams', [data.teams, rankSince])) renderTeamChart(data.teams);
+          LEADERBOARD_LISTS.forEach(([key, listId]) => {
+            if(sectionChanged(key, [leaderboards[key], rankSince])) renderLeaderboard(listId, leaderboards[key]);
+          });
+        }
         
         document.getElementById('sheetUpdated').textContent = data.sheet_updated || '—';
         document.getElementById('lastUpdated').textContent = new Date(data.loaded_at).toLocaleString();
+        renderStaleNotice(data);
       }catch(e){
-        console.error('Failed to load data:', e);
+        console.error('Failed to render data:', e);
       }
     }
 
+    // Cheap string hash per dashboard section so unchanged sections skip rendering
+    function sectionChanged(section, value){
+      const text = JSON.stringify(value);
+      let hash = 0;
+      for(let i = 0; i < text.length; i++){
+        hash = (hash * 31 + text.charCodeAt(i)) | 0;
+      }
+      const key = hash + ':' + text.length;
+      if(sectionHashes[section] === key) return false;
+      sectionHashes[section] = key;
+      return true;
+    }
+
+    function renderStaleNotice(data){
+      const notice = document.getElementById('staleNotice');
+      notice.classList.toggle('visible', !!data.stale);
+      notice.textContent = data.stale
+        ? '⚠ Google Sheets unavailable - showing data from ' + new Date(data.loaded_at).toLocaleString()
+        : '';
+    }
+
+    function rankChangeText(change){
+      if(!change) return '';
+      return change > 0 ? '▲' + change : '▼' + (-change);
+    }
+
+    function rankChangeBadge(change){
+      if(!change) return '';
+      return '<span class="rank-change ' + (change > 0 ? 'up' : 'down') + '" title="' + rankSince + '">' +
+        rankChangeText(change) + '</span>';
+    }
+
     function renderTeamChart(teams){
       const ctx = document.getElementById('teamChart').getContext('2d');
       const sorted = [...teams].sort((a,b) => b.points - a.points);
       const labels = sorted.map(t => t.team);
       const points = sorted.map(t => t.points);
-
-      if(teamChartInstance) teamChartInstance.destroy();
+      chartTeams = sorted;
+
+      // Patch the existing chart instead of rebuilding it and its plugins
+      if(teamChartInstance){
+        const dataset = teamChartInstance.data.datasets[0];
+        teamChartInstance.data.labels = labels;
+        dataset.data = points;
+        dataset.teamNames = labels;
+        dataset.rankChanges = sorted.map(t => t.rank_change);
+        teamChartInstance.update();
+        return;
+      }
 
       teamChartInstance = new Chart(ctx, {
         type: 'bar',
@@ -260,7 +394,8 @@ MAIN_TEMPLATE = """<!doctype html>
             backgroundColor: 'rgba(16, 185, 129, 0.8)',
             borderColor: 'rgba(16, 185, 129, 1)',
             borderWidth: 2,
-            teamNames: labels
+            teamNames: labels,
+            rankChanges: sorted.map(t => t.rank_change)
           }]
         },
         options: {
@@ -269,14 +404,17 @@ MAIN_TEMPLATE = """<!doctype html>
           onClick: (e, activeEls) => {
             if(activeEls.length > 0){
               const index = activeEls[0].index;
-              window.location.href = '/team/' + sorted[index].team;
+              window.location.href = BASE + '/team/' + encodeURIComponent(chartTeams[index].team);
             }
           },
           plugins: {
             legend: {display: false},
             tooltip: {
               callbacks: {
-                label: (ctx) => ctx.parsed.y.toFixed(1) + ' points'
+                label: (ctx) => {
+                  const change = rankChangeText(chartTeams[ctx.dataIndex].rank_change);
+                  return ctx.parsed.y.toFixed(1) + ' points' + (change ? ' (' + change + ' ' + rankSince + ')' : '');
+                }
               }
             },
             datalabels: {
@@ -291,7 +429,8 @@ MAIN_TEMPLATE = """<!doctype html>
               formatter: (value, context) => {
                 const teamName = context.chart.data.datasets[0].teamNames[context.dataIndex];
                 const points = value.toFixed(1);
-                return [teamName, points];
+                const change = rankChangeText(context.chart.data.datasets[0].rankChanges[context.dataIndex]);
+                return change ? [teamName, points, change] : [teamName, points];
               },
               rotation: -90,
               anchor: 'center',
@@ -316,44 +455,118 @@ MAIN_TEMPLATE = """<!doctype html>
       });
     }
 
-    function renderLeaderboard(listId, athletes, searchId){
+    // Leaderboards are virtualized: only the rows inside the scroll window
+    // (plus a few either side) exist in the DOM, positioned absolutely in a
+    // spacer as tall as the whole list. Rows are keyed by athlete and only
+    // rewritten when their rank, name, points or movement changed.
+    const ROW_HEIGHT = 52;
+    const OVERSCAN = 6;
+    const boards = {};
+
+    function debounce(fn, wait){
+      let timer = null;
+      return (...args) => {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn(...args), wait);
+      };
+    }
+
+    function setupLeaderboard(listId, searchId){
       const container = document.getElementById(listId);
-      const searchBox = document.getElementById(searchId);
-      
-      // Add original rank to each athlete
-      let allAthletes = athletes.map((a, i) => ({...a, originalRank: i + 1}));
-      
-      function render(filtered){
-        if(!filtered || filtered.length === 0){
-          container.innerHTML = '<div class="no-result">No athletes found</div>';
-          return;
+      const spacer = document.createElement('div');
+      spacer.className = 'leaderboard-spacer';
+      const empty = document.createElement('div');
+      empty.className = 'no-result';
+      empty.textContent = 'No athletes found';
+      container.appendChild(spacer);
+
+      const board = {container, spacer, empty, athletes: [], names: [], visible: [], rows: new Map(), query: '', frame: 0};
+      boards[listId] = board;
+
+      document.getElementById(searchId).addEventListener('input', debounce((e) => {
+        board.query = e.target.value.toLowerCase().trim();
+        container.scrollTop = 0;
+        applyLeaderboardFilter(board);
+      }, 150));
+
+      container.addEventListener('scroll', () => {
+        if(board.frame) return;
+        board.frame = requestAnimationFrame(() => {
+          board.frame = 0;
+          renderLeaderboardWindow(board);
+        });
+      }, {passive: true});
+    }
+
+    function renderLeaderboard(listId, athletes){
+      const board = boards[listId];
+      // Add original rank to each athlete, and a lowercase name index for filtering
+      board.athletes = athletes.map((a, i) => ({...a, originalRank: i + 1}));
+      board.names = board.athletes.map(a => a.name.toLowerCase());
+      applyLeaderboardFilter(board);
+    }
+
+    function applyLeaderboardFilter(board){
+      const query = board.query;
+      board.visible = query === ''
+        ? board.athletes
+        : board.athletes.filter((a, i) => board.names[i].includes(query));
+      board.spacer.style.height = (board.visible.length * ROW_HEIGHT) + 'px';
+
+      if(board.visible.length === 0){
+        if(!board.empty.isConnected) board.container.appendChild(board.empty);
+      }else if(board.empty.isConnected){
+        board.empty.remove();
+      }
+      renderLeaderboardWindow(board);
+    }
+
+    function renderLeaderboardWindow(board){
+      const {container, spacer, visible, rows} = board;
+      const first = Math.max(0, Math.floor(container.scrollTop / ROW_HEIGHT) - OVERSCAN);
+      const last = Math.min(visible.length, Math.ceil((container.scrollTop + container.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+      const keep = new Set();
+
+      for(let i = first; i < last; i++){
+        const a = visible[i];
+        const key = a.athlete_id + '|' + a.name;
+        keep.add(key);
+
+        let row = rows.get(key);
+        if(!row){
+          row = document.createElement('div');
+          rows.set(key, row);
+          spacer.appendChild(row);
         }
-        
-        let html = '';
-        filtered.forEach((a, i) => {
+
+        const sig = a.originalRank + '|' + a.points.toFixed(1) + '|' + (a.rank_change || 0) + '|' + rankSince;
+        if(row.dataset.sig !== sig){
           const rankClass = a.originalRank === 1 ? 'rank-1' : a.originalRank === 2 ? 'rank-2' : a.originalRank === 3 ? 'rank-3' : '';
-          html += '<div class="athlete-item ' + rankClass + '">';
-          html += '<span class="athlete-rank">' + a.originalRank + '</span>';
-          html += '<span class="athlete-name">' + a.name + '</span>';
-          html += '<span class="athlete-points">' + a.points.toFixed(1) + '</span>';
-          html += '</div>';
-        });
-        container.innerHTML = html;
+          row.className = 'athlete-item ' + rankClass;
+          row.innerHTML =
+            '<span class="athlete-rank">' + a.originalRank + '</span>' +
+            '<span class="athlete-name">' + a.name + rankChangeBadge(a.rank_change) + '</span>' +
+            '<span class="athlete-points">' + a.points.toFixed(1) + '</span>';
+          row.dataset.sig = sig;
+        }
+
+        const top = (i * ROW_HEIGHT) + 'px';
+        if(row.style.top !== top) row.style.top = top;
       }
-      
-      render(allAthletes);
-      
-      searchBox.addEventListener('input', (e) => {
-        const query = e.target.value.toLowerCase().trim();
-        if(query === ''){
-          render(allAthletes);
-        }else{
-          const filtered = allAthletes.filter(a => a.name.toLowerCase().includes(query));
-          render(filtered);
+
+      rows.forEach((row, key) => {
+        if(!keep.has(key)){
+          row.remove();
+          rows.delete(key);
         }
       });
     }
 
+    setupLeaderboard('menRunList', 'searchMenRun');
+    setupLeaderboard('womenRunList', 'searchWomenRun');
+    setupLeaderboard('menRideList', 'searchMenRide');
+    setupLeaderboard('womenRideList', 'searchWomenRide');
+
     const searchBox = document.getElementById('searchBox');
     const clearBtn = document.getElementById('clearBtn');
     const suggestionsDiv = document.getElementById('suggestions');
@@ -371,7 +584,7 @@ MAIN_TEMPLATE = """<!doctype html>
         return;
       }
 
-      const matches = allAthletes.filter(a => a.name.toLowerCase().includes(query)).slice(0, 10);
+      const matches = allAthletes.filter((a, i) => athleteNames[i].includes(query)).slice(0, 10);
 
       if(matches.length > 0){
         suggestionsDiv.style.display = 'block';
@@ -408,8 +621,8 @@ MAIN_TEMPLATE = """<!doctype html>
       resultDiv.innerHTML = '<div style="text-align:center;padding:20px;color:#94a3b8;font-weight:600">Loading...</div>';
       
       try{
-        const res = await fetch('/api/athlete/' + athleteId);
-        const data = await res.json();
+        const res = await fetch(BASE + '/api/athlete/' + athleteId + '?format=columnar');
+        const data = expandActivities(await res.json());
         
         let html = '<div class="result-card">';
         html += '<div class="result-name">' + athlete.name + '</div>';
@@ -447,6 +660,27 @@ MAIN_TEMPLATE = """<!doctype html>
       }
     }
 
+    // Rebuild the dates / daily_activities table shape from the columnar
+    // athlete payload (day offsets + values per activity type)
+    function expandActivities(data){
+      const start = new Date(data.start + 'T00:00:00');
+      const dates = [];
+      for(let d = 0; d < data.days; d++){
+        const day = new Date(start.getFullYear(), start.getMonth(), start.getDate() + d);
+        dates.push(String(day.getDate()).padStart(2, '0') + '/' + String(day.getMonth() + 1).padStart(2, '0'));
+      }
+      const dailyActivities = (data.series || []).map(s => {
+        const values = {};
+        if(s.offsets){
+          s.offsets.forEach((offset, i) => { values[dates[offset]] = s.values[i]; });
+        }else{
+          s.values.forEach((v, i) => { if(v > 0) values[dates[i]] = v; });
+        }
+        return {type: s.type, values: values, total: s.total, active_days: s.active_days};
+      });
+      return {dates: dates, daily_activities: dailyActivities};
+    }
+
     document.addEventListener('click', (e) => {
       if(!searchBox.contains(e.target) && !suggestionsDiv.contains(e.target)){
         suggestionsDiv.style.display = 'none';
@@ -455,6 +689,15 @@ MAIN_TEMPLATE = """<!doctype html>
 
     loadData();
     setInterval(loadData, AUTO_REFRESH_INTERVAL);
+
+    if('serviceWorker' in navigator){
+      navigator.serviceWorker.register(BASE + '/sw.js').catch((e) => console.error('Service worker failed:', e));
+      navigator.serviceWorker.addEventListener('message', (e) => {
+        // The worker sends the body it just cached; fetching again would
+        // start another revalidation
+        if(e.data && e.data.type === 'data-updated' && e.data.url.split('?')[0].endsWith('/api/data')) applyData(e.data.body);
+      });
+    }
   </script>
 </body>
 </html>
@@ -485,15 +728,19 @@ TEAM_TEMPLATE = """<!doctype html>
     .team-table th:nth-child(2),.team-table td:nth-child(2),
     .team-table th:nth-child(3),.team-table td:nth-child(3),
     .team-table th:nth-child(4),.team-table td:nth-child(4){text-align:right}
+    .stale-notice{margin-top:8px;color:#fbbf24;font-size:13px;font-weight:700}
   </style>
 </head>
 <body>
   <div class="container">
-    <a href="/" class="back-btn">← Back to Dashboard</a>
+    <a href="{{ base or '/' }}" class="back-btn">← Back to Dashboard</a>
     
     <div class="header">
       <h1>{{ team_id }} - Team Details</h1>
       <p style="color:#94a3b8;font-size:16px;font-weight:600">Total: <strong style="color:#10b981;font-size:18px">{{ total_points }}</strong> points</p>
+      {% if stale %}
+      <p class="stale-notice">⚠ Google Sheets unavailable - showing data from {{ updated_at }}</p>
+      {% endif %}
     </div>
 
     <div class="card">
@@ -530,6 +777,87 @@ TEAM_TEMPLATE = """<!doctype html>
 </html>
 """
 
+SERVICE_WORKER_JS = """// Dashboard service worker: app shell, chart libraries, the last /api/data
+// response and the last MAX_ATHLETE_RESPONSES /api/athlete/<id> responses are
+// answered from cache at once and revalidated in the background with
+// If-None-Match. When a revalidation brings new data its body is posted to
+// the pages, which render it without requesting it again.
+const SHELL_CACHE = 'gef-shell-CACHE_VERSION';
+const DATA_CACHE = 'gef-data-CACHE_VERSION';
+const SCOPE = self.registration.scope;
+const MAX_ATHLETE_RESPONSES = 20;
+const LIBRARIES = [
+  'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+  'https://cdn.jsdelivr.net/npm/chartjs-plugin-datalabels@2.2.0/dist/chartjs-plugin-datalabels.min.js'
+];
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(caches.open(SHELL_CACHE).then((cache) =>
+    Promise.all([SCOPE, ...LIBRARIES].map((url) =>
+      fetch(url).then((res) => res.ok ? cache.put(url, res) : null).catch(() => null)
+    ))
+  ).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(caches.keys().then((keys) => Promise.all(
+    keys.filter((key) => key.startsWith('gef-') && key !== SHELL_CACHE && key !== DATA_CACHE)
+      .map((key) => caches.delete(key))
+  )).then(() => self.clients.claim()));
+});
+
+function cacheFor(url){
+  if(url.href === SCOPE || LIBRARIES.includes(url.href)) return SHELL_CACHE;
+  if(!url.href.startsWith(SCOPE)) return null;
+  const path = url.href.slice(SCOPE.length).split('?')[0];
+  if(path === 'api/data' || /^api\\/athlete\\/[^\\/]+$/.test(path)) return DATA_CACHE;
+  return null;
+}
+
+async function revalidate(cacheName, request, cached){
+  const headers = {};
+  const etag = cached && cached.headers.get('ETag');
+  if(etag) headers['If-None-Match'] = etag;
+  const res = await fetch(request.url, {headers: headers, credentials: 'same-origin'});
+  if(res.status === 304) return cached;
+  if(res.ok){
+    const cache = await caches.open(cacheName);
+    await cache.put(request.url, res.clone());
+    if(cacheName === DATA_CACHE) await trimAthleteResponses(cache);
+    if(cached && cacheName === DATA_CACHE){
+      const body = await res.clone().json();
+      const clients = await self.clients.matchAll();
+      clients.forEach((client) => client.postMessage({type: 'data-updated', url: request.url, body: body}));
+    }
+  }
+  return res;
+}
+
+// Cache keys are kept in insertion order and put() re-inserts, so the
+// oldest keys are the least recently fetched athletes
+async function trimAthleteResponses(cache){
+  const athletes = (await cache.keys()).filter((req) => req.url.includes('/api/athlete/'));
+  await Promise.all(athletes.slice(0, Math.max(athletes.length - MAX_ATHLETE_RESPONSES, 0))
+    .map((req) => cache.delete(req)));
+}
+
+self.addEventListener('fetch', (event) => {
+  if(event.request.method !== 'GET') return;
+  const cacheName = cacheFor(new URL(event.request.url));
+  if(!cacheName) return;
+
+  event.respondWith(caches.open(cacheName).then(async (cache) => {
+    const cached = await cache.match(event.request.url);
+    const update = revalidate(cacheName, event.request, cached);
+    if(cached){
+      event.waitUntil(update.catch(() => null));
+      return cached;
+    }
+    return update;
+  }));
+});
+""".replace("CACHE_VERSION", hashlib.sha1(MAIN_TEMPLATE.encode()).hexdigest()[:8])
+
 
 def load_service_account_credentials():
     try:
@@ -549,26 +877,196 @@ def load_service_account_credentials():
             return creds
     except Exception as e:
         logger.exception("Error loading credentials: %s", e)
+    if SHEETS_API_URL:
+        # Local Sheets API stand-ins (sheets_stub.py) need no credentials
+        return AnonymousCredentials()
     return None
 
 
-def read_google_sheet(creds, sheet_name):
-    """Read data from a Google Sheet"""
-    try:
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(SHEET_ID)
-        ws = sh.worksheet(sheet_name)
-        rows = ws.get_all_values()
-        if not rows:
-            return pd.DataFrame()
-        headers = rows[0]
-        data = rows[1:]
-        df = pd.DataFrame(data, columns=headers)
+class SheetsEndpointHTTPClient(gspread.http_client.HTTPClient):
+    """gspread HTTP client that sends Sheets API calls to SHEETS_API_URL"""
+
+    def request(self, method, endpoint, *args, **kwargs):
+        if endpoint.startswith(GOOGLE_SHEETS_API_URL):
+            endpoint = SHEETS_API_URL + endpoint[len(GOOGLE_SHEETS_API_URL):]
+        return super().request(method, endpoint, *args, **kwargs)
+
+
+class SheetsUnavailable(Exception):
+    """Raised when a sheet could not be read from the Sheets API"""
+
+
+class RequestBudget:
+    """
+    Sliding one-minute window of Sheets API calls
+
+    The read quota belongs to the service account, but a budget only sees
+    the calls of its own process. It is shared by the clients of every
+    challenge served by the process, and under gunicorn split_budget()
+    gives each worker its share of SHEETS_REQUESTS_PER_MINUTE. Deployments
+    running several dynos against one account must lower that setting.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._calls = deque()
+
+    def wait(self):
+        """Block until a call fits in the budget, then count it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                if len(self._calls) < self.requests_per_minute:
+                    self._calls.append(now)
+                    return
+                wait = 60 - (now - self._calls[0])
+            logger.info(f"Sheets request budget used up, waiting {wait:.1f}s")
+            time.sleep(wait)
+
+
+sheets_budget = RequestBudget(SHEETS_REQUESTS_PER_MINUTE)
+
+
+def split_budget(workers):
+    """Limit this worker process to its share of the Sheets request budget"""
+    sheets_budget.requests_per_minute = max(
+        1, SHEETS_REQUESTS_PER_MINUTE // workers)
+
+
+class SheetsClient:
+    """
+    Google Sheets reader that stays inside the API quota
+
+    - Every call first waits for the shared RequestBudget, so callers wait
+      for budget instead of getting a 429
+    - 429, 5xx and connection errors are retried with jittered
+      exponential backoff (honouring Retry-After when the API sends it)
+    - After failure_threshold reads in a row fail the circuit opens and
+      reads fail fast for reset_seconds, then one trial read is let through
+    """
+
+    def __init__(self, sheet_id, budget, max_retries, backoff_base,
+                 backoff_max, failure_threshold, reset_seconds):
+        self.sheet_id = sheet_id
+        self.budget = budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._spreadsheet = None
+
+    def circuit_state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return 'open'
+            return 'half-open'
+
+    def reset_connection(self):
+        """Drop the cached spreadsheet handle and its pooled connections"""
+        self._spreadsheet = None
+
+    def read(self, creds, sheet_name):
+        """Read a worksheet into a DataFrame, raising SheetsUnavailable"""
+        self._enter_circuit()
+        try:
+            rows = self._read_values(creds, sheet_name)
+            if not rows:
+                df = pd.DataFrame()
+            else:
+                # Pad the header and every row to the widest row, like
+                # get_all_values: cells right of the last header are kept
+                rows = gspread.utils.fill_gaps(rows)
+                df = pd.DataFrame(rows[1:], columns=rows[0])
+        except Exception as e:
+            self._record_failure()
+            raise SheetsUnavailable(
+                f"Failed reading sheet {sheet_name}: {e}") from e
+        finally:
+            self._trial_running = False
+        self._record_success()
+
         logger.info(f"Loaded {sheet_name}: {len(df)} rows")
         return df
-    except Exception as e:
-        logger.exception(f"Failed reading sheet {sheet_name}: %s", e)
-        return pd.DataFrame()
+
+    def _enter_circuit(self):
+        state = self.circuit_state()
+        if state == 'open':
+            raise SheetsUnavailable('Sheets API circuit breaker is open')
+        if state == 'half-open':
+            with self._lock:
+                if self._trial_running:
+                    raise SheetsUnavailable(
+                        'Sheets API circuit breaker is open')
+                self._trial_running = True
+
+    def _record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Sheets API circuit breaker closed")
+            self._failures = 0
+            self._opened_at = None
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or \
+                    self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                logger.warning(
+                    f"Sheets API circuit breaker open for {self.reset_seconds}s "
+                    f"after {self._failures} failed reads")
+
+    def _read_values(self, creds, sheet_name):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self._spreadsheet is None:
+                    self.budget.wait()
+                    client = gspread.authorize(
+                        creds, http_client=SheetsEndpointHTTPClient
+                        if SHEETS_API_URL else gspread.http_client.HTTPClient)
+                    self._spreadsheet = client.open_by_key(self.sheet_id)
+                self.budget.wait()
+                result = self._spreadsheet.values_get(
+                    gspread.utils.absolute_range_name(sheet_name))
+                return result.get('values', [])
+            except gspread.exceptions.APIError as e:
+                status = e.response.status_code
+                retryable = status == 429 or status >= 500
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e.response.headers)
+            except (requests.ConnectionError, requests.Timeout):
+                self._spreadsheet = None
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            logger.warning(
+                f"Sheets read of {sheet_name} failed (attempt {attempt + 1}), "
+                f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _backoff(self, attempt, headers=None):
+        retry_after = (headers or {}).get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter keeps workers that failed together from retrying together
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+def read_google_sheet(challenge, creds, sheet_name):
+    """Read data from a Google Sheet, raising SheetsUnavailable on failure"""
+    return challenge.sheets.read(creds, sheet_name)
 
 
 def create_gender_map(team_data_df):
@@ -630,37 +1128,22 @@ def create_gender_map(team_data_df):
     return gender_map
 
 
-def compute_main_data(source_df, team_data_df):
+def normalize_source(source_df):
     """
-    Compute dashboard data from SOURCE sheet with gender lookup from TEAM DATA
-
-    SOURCE sheet columns:
-    - Athlete: /athletes/ID format (or use ID column directly)
-    - ID (Column W): athlete IDs extracted from Athlete column
-    - Name: athlete name  
-    - Date or Day: activity date
-    - Run, Walk, ride: point values
-    - Total: total points
-    - Team: team identifier
+    Prepare SOURCE rows once per snapshot
+
+    Returns a new frame with only the athlete_id, athlete_name, team,
+    date_parsed and numeric point columns; the compute_* functions below
+    only read from it, so a single prepared frame can be shared by
+    concurrent requests. The text columns are categoricals: per row they
+    hold an integer code in one contiguous array instead of a pointer to
+    a string object, so the frame stays mostly numeric buffers that
+    forked workers can share without touching refcounts. Group them with
+    observed=True.
     """
-
+    source_df = source_df.copy()
     source_df.columns = [str(c).strip() for c in source_df.columns]
 
-    # Find most recent date in the sheet
-    sheet_updated = "Unknown"
-    try:
-        date_col = 'Day' if 'Day' in source_df.columns else 'Date'
-        source_df['date_parsed'] = pd.to_datetime(
-            source_df[date_col], errors='coerce')
-        max_date = source_df['date_parsed'].max()
-        if pd.notna(max_date):
-            sheet_updated = max_date.strftime('%d %b %Y')
-    except Exception as e:
-        logger.warning(f"Could not parse sheet update date: {e}")
-
-    # Create gender map from TEAM DATA
-    gender_map = create_gender_map(team_data_df)
-
     # Get athlete ID - try ID column first, then extract from Athlete column
     if 'ID' in source_df.columns:
         source_df['athlete_id'] = source_df['ID'].astype(str).str.strip()
@@ -672,8 +1155,10 @@ def compute_main_data(source_df, team_data_df):
     source_df['athlete_name'] = source_df['Name'].astype(str).str.strip()
     source_df['team'] = source_df['Team'].astype(str).str.strip()
 
-    # Lookup gender from gender_map
-    source_df['gender'] = source_df['athlete_id'].map(gender_map).fillna('M')
+    # Use 'Day' column if available, otherwise 'Date'
+    date_col = 'Day' if 'Day' in source_df.columns else 'Date'
+    source_df['date_parsed'] = pd.to_datetime(
+        source_df.get(date_col), errors='coerce')
 
     # Convert point columns to numeric
     source_df['run_points'] = pd.to_numeric(
@@ -685,16 +1170,53 @@ def compute_main_data(source_df, team_data_df):
     source_df['total_points'] = pd.to_numeric(
         source_df.get('Total', 0), errors='coerce').fillna(0)
 
-    # CRITICAL FIX: Filter out invalid teams BEFORE any processing
-    # This ensures #N/A teams never make it into the teams chart
+    source_df = source_df[PREPARED_COLUMNS].reset_index(drop=True)
+    for column in ('athlete_id', 'athlete_name', 'team'):
+        source_df[column] = source_df[column].astype('category')
+    return source_df
+
+
+def valid_team_rows(source_df):
+    """Drop rows whose team is blank or a sheet error such as #N/A"""
     invalid_teams = ['NAN', 'N/A', 'NA', 'NONE', '#N/A', '', 'NULL']
-    source_df = source_df[
+    return source_df[
         (source_df['team'].notna()) &
         (~source_df['team'].str.upper().isin(invalid_teams))
-    ].copy()
+    ]
+
+
+def compute_main_data(source_df, gender_map):
+    """
+    Compute dashboard data from normalized SOURCE rows with gender lookup
+    from the TEAM DATA gender map
+
+    SOURCE sheet columns:
+    - Athlete: /athletes/ID format (or use ID column directly)
+    - ID (Column W): athlete IDs extracted from Athlete column
+    - Name: athlete name  
+    - Date or Day: activity date
+    - Run, Walk, ride: point values
+    - Total: total points
+    - Team: team identifier
+    """
+
+    # Find most recent date in the sheet
+    sheet_updated = "Unknown"
+    max_date = source_df['date_parsed'].max()
+    if pd.notna(max_date):
+        sheet_updated = max_date.strftime('%d %b %Y')
+
+    # Lookup gender from gender_map
+    source_df = source_df.assign(gender=source_df['athlete_id'].astype(
+        object).map(gender_map).fillna('M'))
+
+    # CRITICAL FIX: Filter out invalid teams BEFORE any processing
+    # This ensures #N/A teams never make it into the teams chart
+    source_df = valid_team_rows(source_df)
 
     # Overall athletes (aggregate by athlete)
-    athlete_stats = source_df.groupby(['athlete_name', 'athlete_id', 'team', 'gender']).agg({
+    athlete_stats = source_df.groupby(['athlete_name', 'athlete_id', 'team', 'gender'],
+                                      observed=True).agg({
         'total_points': 'sum'
     }).reset_index()
     athlete_stats.columns = ['name', 'athlete_id', 'team', 'gender', 'points']
@@ -702,8 +1224,9 @@ def compute_main_data(source_df, team_data_df):
 
     # Gender-based leaderboards
     # Men Run/Walk
-    men_df = source_df[source_df['gender'] == 'M'].copy()
-    men_run_walk = men_df.groupby(['athlete_name', 'athlete_id']).agg({
+    men_df = source_df[source_df['gender'] == 'M']
+    men_run_walk = men_df.groupby(['athlete_name', 'athlete_id'],
+                                  observed=True).agg({
         'run_points': 'sum',
         'walk_points': 'sum'
     }).reset_index()
@@ -711,12 +1234,14 @@ def compute_main_data(source_df, team_data_df):
         men_run_walk['walk_points']
     men_run_walk = men_run_walk[men_run_walk['points']
                                 > 0].sort_values('points', ascending=False)
-    men_run_list = [{'name': row['athlete_name'], 'points': row['points']}
+    men_run_list = [{'name': row['athlete_name'], 'athlete_id': row['athlete_id'],
+                     'points': row['points']}
                     for _, row in men_run_walk.iterrows()]
 
     # Women Run/Walk
-    women_df = source_df[source_df['gender'] == 'F'].copy()
-    women_run_walk = women_df.groupby(['athlete_name', 'athlete_id']).agg({
+    women_df = source_df[source_df['gender'] == 'F']
+    women_run_walk = women_df.groupby(['athlete_name', 'athlete_id'],
+                                      observed=True).agg({
         'run_points': 'sum',
         'walk_points': 'sum'
     }).reset_index()
@@ -724,31 +1249,38 @@ def compute_main_data(source_df, team_data_df):
         women_run_walk['walk_points']
     women_run_walk = women_run_walk[women_run_walk['points'] > 0].sort_values(
         'points', ascending=False)
-    women_run_list = [{'name': row['athlete_name'], 'points': row['points']}
+    women_run_list = [{'name': row['athlete_name'], 'athlete_id': row['athlete_id'],
+                      'points': row['points']}
                       for _, row in women_run_walk.iterrows()]
 
     # Men Ride
-    men_ride = men_df.groupby(['athlete_name', 'athlete_id'])[
+    men_ride = men_df.groupby(['athlete_name', 'athlete_id'], observed=True)[
         'ride_points'].sum().reset_index()
     men_ride = men_ride[men_ride['ride_points'] >
                         0].sort_values('ride_points', ascending=False)
-    men_ride_list = [{'name': row['athlete_name'], 'points': row['ride_points']}
+    men_ride_list = [{'name': row['athlete_name'], 'athlete_id': row['athlete_id'],
+                     'points': row['ride_points']}
                      for _, row in men_ride.iterrows()]
 
     # Women Ride
-    women_ride = women_df.groupby(['athlete_name', 'athlete_id'])[
+    women_ride = women_df.groupby(['athlete_name', 'athlete_id'],
+                                  observed=True)[
         'ride_points'].sum().reset_index()
     women_ride = women_ride[women_ride['ride_points'] >
                             0].sort_values('ride_points', ascending=False)
-    women_ride_list = [{'name': row['athlete_name'], 'points': row['ride_points']}
+    women_ride_list = [{'name': row['athlete_name'], 'athlete_id': row['athlete_id'],
+                       'points': row['ride_points']}
                        for _, row in women_ride.iterrows()]
 
     # Teams - now using already filtered data
-    team_totals = source_df.groupby('team')['total_points'].sum().reset_index()
+    team_totals = source_df.groupby('team', observed=True)[
+        'total_points'].sum().reset_index()
+    team_totals = team_totals.sort_values('total_points', ascending=False)
     teams_data = []
-    for _, row in team_totals.iterrows():
+    for rank, (_, row) in enumerate(team_totals.iterrows(), start=1):
         teams_data.append(
-            {'team': row['team'], 'points': float(row['total_points'])})
+            {'team': row['team'], 'points': float(row['total_points']),
+             'rank': rank})
 
     logger.info(
         f"Created {len(teams_data)} valid teams (no #N/A or invalid teams)")
@@ -769,33 +1301,13 @@ def compute_main_data(source_df, team_data_df):
 
 
 def compute_team_details(source_df, team_id):
-    """Compute team member details from SOURCE sheet"""
-    source_df.columns = [str(c).strip() for c in source_df.columns]
-
-    # Get athlete ID
-    if 'ID' in source_df.columns:
-        source_df['athlete_id'] = source_df['ID'].astype(str).str.strip()
-    else:
-        source_df['athlete_id'] = source_df['Athlete'].astype(
-            str).str.extract(r'/athletes/(\d+)')[0]
-
-    source_df['athlete_name'] = source_df['Name'].astype(str).str.strip()
-    source_df['team'] = source_df['Team'].astype(str).str.strip()
-    source_df['run_points'] = pd.to_numeric(
-        source_df.get('Run', 0), errors='coerce').fillna(0)
-    source_df['walk_points'] = pd.to_numeric(
-        source_df.get('Walk', 0), errors='coerce').fillna(0)
-    source_df['ride_points'] = pd.to_numeric(
-        source_df.get('ride', 0), errors='coerce').fillna(0)
-    source_df['total_points'] = pd.to_numeric(
-        source_df.get('Total', 0), errors='coerce').fillna(0)
-
-    team_df = source_df[source_df['team'] == team_id].copy()
+    """Compute team member details from normalized SOURCE rows"""
+    team_df = source_df[source_df['team'] == team_id]
     if team_df.empty:
         return []
 
     members = []
-    for athlete_id, group in team_df.groupby('athlete_id'):
+    for athlete_id, group in team_df.groupby('athlete_id', observed=True):
         name = group['athlete_name'].iloc[0]
         run_walk = group['run_points'].sum() + group['walk_points'].sum()
         ride = group['ride_points'].sum()
@@ -811,35 +1323,14 @@ def compute_team_details(source_df, team_id):
     return members
 
 
-def compute_athlete_activities(source_df, athlete_id):
-    """Compute individual athlete activity details from SOURCE sheet"""
-    source_df.columns = [str(c).strip() for c in source_df.columns]
-
-    # Get athlete ID
-    if 'ID' in source_df.columns:
-        source_df['athlete_id'] = source_df['ID'].astype(str).str.strip()
-    else:
-        source_df['athlete_id'] = source_df['Athlete'].astype(
-            str).str.extract(r'/athletes/(\d+)')[0]
-
-    # Use 'Day' column if available, otherwise 'Date'
-    date_col = 'Day' if 'Day' in source_df.columns else 'Date'
-    source_df['date_parsed'] = pd.to_datetime(
-        source_df[date_col], errors='coerce')
-
-    source_df['run_points'] = pd.to_numeric(
-        source_df.get('Run', 0), errors='coerce').fillna(0)
-    source_df['walk_points'] = pd.to_numeric(
-        source_df.get('Walk', 0), errors='coerce').fillna(0)
-    source_df['ride_points'] = pd.to_numeric(
-        source_df.get('ride', 0), errors='coerce').fillna(0)
-
+def compute_athlete_activities(source_df, athlete_id, start):
+    """Compute individual athlete activity details from normalized SOURCE rows"""
     athlete_df = source_df[source_df['athlete_id'] == athlete_id].copy()
     if athlete_df.empty:
         return {'dates': [], 'daily_activities': []}
 
     today = datetime.now(pytz.timezone(TIMEZONE)).date()
-    date_range = pd.date_range(start=START_DATE, end=today, freq='D')
+    date_range = pd.date_range(start=start, end=today, freq='D')
     date_labels = [d.strftime('%d/%m') for d in date_range]
 
     athlete_df['date_label'] = athlete_df['date_parsed'].dt.strftime('%d/%m')
@@ -899,59 +1390,825 @@ def compute_athlete_activities(source_df, athlete_id):
     return {'dates': date_labels, 'daily_activities': activities}
 
 
-@app.route('/')
-def index():
-    return render_template_string(MAIN_TEMPLATE)
+class CumulativePoints:
+    """
+    Running point totals per key (team or athlete) and day
 
+    cumsum[i, d] is the total of keys[i] up to and including day d, where
+    day 0 is the challenge start; ranks[i, d] is the matching standing (1 = most
+    points, ties share the better rank). Any "as of D" lookup is a single
+    array index.
+    """
 
-@app.route('/api/data')
-def api_data():
-    try:
-        creds = load_service_account_credentials()
-        if not creds:
-            return jsonify({'error': 'No credentials available'}), 500
+    def __init__(self, keys, start, cumsum):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+        self.start = start
+        self.cumsum = cumsum
+        self.ranks = pd.DataFrame(cumsum).rank(
+            axis=0, method='min', ascending=False).to_numpy(dtype=np.int32)
+
+    @property
+    def days(self):
+        return self.cumsum.shape[1]
+
+    @property
+    def nbytes(self):
+        return (self.cumsum.nbytes + self.ranks.nbytes +
+                approximate_nbytes(self.index))
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.days - 1)
+
+    def offset(self, day):
+        """Day offset from start for a date, clamped into the window"""
+        return min(max((day - self.start).days, 0), self.days - 1)
+
+    def date_labels(self, first, last):
+        return [(self.start + timedelta(days=d)).isoformat()
+                for d in range(first, last + 1)]
+
+
+def day_offsets(dated_df, start, days):
+    """Days since start for dated rows, clamped into [0, days)"""
+    return (dated_df['date_parsed'].dt.normalize() -
+            pd.Timestamp(start)).dt.days.clip(0, days - 1)
+
+
+def build_cumulative_points(source_df, key_col, start, end):
+    """
+    Build CumulativePoints for key_col from normalized SOURCE rows
+
+    Rows dated before start count towards day 0 and rows after end towards
+    the last day, so the final column matches the all-time totals; rows
+    without a parseable date cannot be placed and are left out.
+    """
+    days = max((end - start).days + 1, 1)
+    dated = source_df[source_df['date_parsed'].notna()]
+    offsets = day_offsets(dated, start, days).to_numpy()
+    codes, keys = pd.factorize(dated[key_col], sort=True)
+
+    daily = np.zeros((len(keys), days))
+    np.add.at(daily, (codes, offsets), dated['total_points'].to_numpy())
+    return CumulativePoints(list(keys), start, daily.cumsum(axis=1))
+
+
+def parse_history_window(args, cumulative):
+    """
+    Turn ?date= or ?from=&to= query args into a day range
+
+    Returns (first, last, single) day offsets; a missing bound defaults to
+    the start or end of the challenge window. Raises ValueError for dates
+    that are not YYYY-MM-DD.
+    """
+    if args.get('date'):
+        day = cumulative.offset(date.fromisoformat(args['date']))
+        return day, day, True
+    first, last = 0, cumulative.days - 1
+    if args.get('from'):
+        first = cumulative.offset(date.fromisoformat(args['from']))
+    if args.get('to'):
+        last = cumulative.offset(date.fromisoformat(args['to']))
+    return first, max(first, last), False
+
+
+def annotate_rank_changes(main_data, team_history, daily, cutoff, tz):
+    """
+    Add rank_change to every leaderboard and team entry of main_data
+    (positive = moved up, None = not ranked then) against the standings
+    at the end of day cutoff, and set rank_baseline_at to that moment
+
+    Baseline points are the current points minus what was logged after
+    cutoff, read from the team cumulative array and the athlete x day
+    array of compute_athlete_daily; undated rows count towards the
+    baseline, as they cannot have moved anyone since. The baseline depends
+    only on the sheets and the date, so every worker, restart and deploy
+    agrees on it.
+    """
+    after = min(max((cutoff - team_history.start).days + 1, 0),
+                team_history.days)
+    cumsum = team_history.cumsum
+    team_after = cumsum[:, -1] - (cumsum[:, after - 1] if after else 0)
+    # [type, athlete] points logged after cutoff, in ACTIVITY_TYPES order
+    athlete_after = daily['values'][:, :, after:].sum(axis=2)
+
+    def annotate(entries, key, points_after):
+        baseline = [(round(entry['points'] - points_after(entry), 1), n)
+                    for n, entry in enumerate(entries)]
+        baseline.sort(key=lambda b: -b[0])
+        previous = {entries[n][key]: rank for rank, (points, n) in
+                    enumerate(baseline, start=1) if points > 0}
+        for rank, entry in enumerate(entries, start=1):
+            before = previous.get(entry[key])
+            entry['rank_change'] = None if before is None else before - rank
+
+    def athlete_points_after(types):
+        def points_after(entry):
+            i = daily['index'].get(entry['athlete_id'])
+            return 0 if i is None else float(athlete_after[types, i].sum())
+        return points_after
+
+    for board, entries in main_data['leaderboards'].items():
+        types = [2] if board.endswith('_ride') else [0, 1]
+        annotate(entries, 'athlete_id', athlete_points_after(types))
+    annotate(main_data['teams'], 'team', lambda entry: float(
+        team_after[team_history.index[entry['team']]])
+        if entry['team'] in team_history.index else 0)
+
+    main_data['rank_baseline_at'] = tz.localize(datetime.combine(
+        cutoff + timedelta(days=1), datetime.min.time())).isoformat()
+
+
+def compute_team_heatmap(source_df, start, end, split):
+    """
+    Daily points per team for the whole challenge window
+
+    One pivot over the valid SOURCE rows. The result is columnar: values is
+    a flat row-major array of shape [metric, team, day], with metrics either
+    ['total'] or ['run', 'walk', 'ride'] when split.
+    """
+    metrics = ['run', 'walk', 'ride'] if split else ['total']
+    columns = [f"{m}_points" for m in metrics]
+    days = max((end - start).days + 1, 1)
+
+    dated = valid_team_rows(source_df)
+    dated = dated[dated['date_parsed'].notna()]
+    dated = dated.assign(day=day_offsets(dated, start, days))
+    pivot = dated.pivot_table(index='team', columns='day', values=columns,
+                              aggfunc='sum', fill_value=0, observed=True)
+    pivot = pivot.reindex(
+        columns=pd.MultiIndex.from_product([columns, range(days)]),
+        fill_value=0)
+
+    teams = list(pivot.index)
+    values = pivot.to_numpy().reshape(len(teams), len(metrics), days)
+    values = np.round(values.transpose(1, 0, 2), 1)
+    return {
+        'teams': teams,
+        'days': [(start + timedelta(days=d)).isoformat() for d in range(days)],
+        'metrics': metrics,
+        'shape': list(values.shape),
+        'values': values.ravel().tolist()
+    }
+
+
+def compute_athlete_daily(source_df, start, end):
+    """
+    Athlete x day points per activity type for the whole challenge window
+
+    Returns the athletes as (athlete_id, name, team) sorted by team and
+    name, and a float array of shape [type, athlete, day] in ACTIVITY_TYPES
+    order, filled with one scatter-add over the valid SOURCE rows.
+    """
+    days = max((end - start).days + 1, 1)
+    dated = valid_team_rows(source_df)
+    dated = dated[dated['date_parsed'].notna()]
+
+    athletes = dated.groupby('athlete_id', observed=True)[
+        ['athlete_name', 'team']].first()
+    athletes = athletes.sort_values(['team', 'athlete_name'])
+    index = pd.Index(athletes.index)
+    rows = index.get_indexer(dated['athlete_id'])
+    offsets = day_offsets(dated, start, days).to_numpy()
+
+    values = np.zeros((len(ACTIVITY_TYPES), len(index), days))
+    for i, (_, column) in enumerate(ACTIVITY_TYPES):
+        np.add.at(values[i], (rows, offsets), dated[column].to_numpy())
+    return {
+        'athletes': list(zip(athletes.index, athletes['athlete_name'],
+                             athletes['team'])),
+        'index': {athlete_id: i for i, athlete_id in enumerate(index)},
+        'values': values
+    }
 
-        # Read both sheets
-        source_df = read_google_sheet(creds, 'SOURCE')
-        team_data_df = read_google_sheet(creds, 'TEAM DATA')
 
-        if source_df.empty:
-            return jsonify({'error': 'SOURCE sheet is empty'}), 500
+def compute_athlete_columnar(daily, athlete_id, start, first, last, dense):
+    """
+    Athlete activity as parallel arrays over days first..last
+
+    The compact alternative to compute_athlete_activities: no 'dd/mm' keys
+    and no '-' filler. Each activity type with points in the window gets
+    offsets (days since the window start) and values for its active days,
+    or, when dense, one value per day of the window.
+    """
+    window_start = start + timedelta(days=first)
+    result = {'start': window_start.isoformat(), 'days': last - first + 1,
+              'series': []}
+    i = daily['index'].get(athlete_id)
+    if i is None:
+        return result
+
+    for t, (label, _) in enumerate(ACTIVITY_TYPES):
+        window = np.round(daily['values'][t, i, first:last + 1], 1)
+        active = np.flatnonzero(window > 0)
+        if len(active) == 0:
+            continue
+        series = {'type': label,
+                  'total': round(float(window[active].sum()), 1),
+                  'active_days': len(active)}
+        if dense:
+            series['values'] = window.tolist()
+        else:
+            series['offsets'] = active.tolist()
+            series['values'] = window[active].tolist()
+        result['series'].append(series)
+    return result
+
+
+def leaderboard_rows(main_data):
+    """Yield CSV rows for the four gender leaderboards"""
+    yield ['Board', 'Rank', 'Athlete ID', 'Name', 'Points', 'Rank Change']
+    for board, title in LEADERBOARD_TITLES.items():
+        for rank, entry in enumerate(main_data['leaderboards'][board], start=1):
+            yield [title, rank, entry['athlete_id'], entry['name'],
+                   f"{entry['points']:.1f}", entry.get('rank_change')]
+
+
+def team_rows(main_data):
+    """Yield CSV rows for the team standings"""
+    yield ['Rank', 'Team', 'Points', 'Rank Change']
+    for entry in main_data['teams']:
+        yield [entry['rank'], entry['team'], f"{entry['points']:.1f}",
+               entry.get('rank_change')]
+
+
+def activity_rows(daily, start, team=None):
+    """
+    Yield one row per athlete and activity type with a column per day
+
+    Empty days are left blank, like the '-' cells of the athlete table.
+    """
+    days = daily['values'].shape[2]
+    yield (['Athlete ID', 'Name', 'Team', 'Type'] +
+           [(start + timedelta(days=d)).isoformat() for d in range(days)] +
+           ['Total', 'Active Days'])
+    for i, (athlete_id, name, athlete_team) in enumerate(daily['athletes']):
+        if team is not None and athlete_team != team:
+            continue
+        for t, (label, _) in enumerate(ACTIVITY_TYPES):
+            series = daily['values'][t, i]
+            yield ([athlete_id, name, athlete_team, label] +
+                   [round(float(v), 1) if v > 0 else None for v in series] +
+                   [round(float(series.sum()), 1), int((series > 0).sum())])
+
+
+def stream_csv(rows):
+    """Encode rows as CSV, yielding EXPORT_CHUNK_ROWS rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for n, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_xlsx(rows, title):
+    """
+    Write rows to an openpyxl write-only workbook and stream the file
+
+    Write-only worksheets spool rows to a temporary file instead of keeping
+    cells in memory, and the finished workbook is saved to another
+    temporary file that is sent in chunks. An .xlsx is a zip archive, so
+    nothing can be sent before the last row is written.
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title)
+    for row in rows:
+        worksheet.append(row)
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_response(chunks, filename, mimetype):
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def approximate_nbytes(value):
+    """Rough deep size of arrays, frames and JSON-like trees of them"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            approximate_nbytes(k) + approximate_nbytes(v)
+            for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(map(approximate_nbytes, value))
+    return sys.getsizeof(value)
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot cannot be built from the sheets"""
+
+
+class Snapshot:
+    """
+    Prepared sheet data shared read-only by every request
+
+    Besides the views the routes serve it keeps what the next refresh needs
+    to skip work: each worksheet's content fingerprint and when it was last
+    checked, and the gender map built from TEAM DATA.
+    """
 
-        if team_data_df.empty:
+    def __init__(self, version, source_df, gender_map, main_data,
+                 team_history, athlete_history, loaded_at, source_version,
+                 team_version, source_checked_at, team_checked_at,
+                 derived=None):
+        self.version = version
+        self.source = source_df
+        self.gender_map = gender_map
+        self.team_history = team_history
+        self.athlete_history = athlete_history
+        self.loaded_at = loaded_at
+        self.created = time.monotonic()
+        # The dashboard data is only kept encoded: /api/data sends this one
+        # buffer, and a tree of small dicts would not stay shared after fork
+        self.main_json = json.dumps(main_data, sort_keys=True, default=str,
+                                    separators=(',', ':')).encode()
+        # Content hashes, comparable across workers: the dashboard data and
+        # the SOURCE / TEAM DATA worksheets it was built from
+        self.data_version = hashlib.sha1(self.main_json).hexdigest()[:16]
+        self.source_version = source_version
+        self.team_version = team_version
+        self.source_checked_at = source_checked_at
+        self.team_checked_at = team_checked_at
+        self._derived = derived if derived is not None else {}
+        self._derived_lock = threading.Lock()
+        # Approximate footprint used by the challenge LRU; derived() adds
+        # each view it stores and then calls on_resize with the snapshot
+        self.nbytes = (approximate_nbytes(source_df) +
+                       len(self.main_json) +
+                       team_history.nbytes + athlete_history.nbytes +
+                       sum(map(approximate_nbytes, self._derived.values())))
+        self.on_resize = None
+
+    def derived(self, key, compute):
+        """
+        Compute a view of this snapshot once and reuse it until replaced
+
+        Views must only depend on self.source: they are carried over to the
+        next snapshot when only TEAM DATA changed.
+        """
+        with self._derived_lock:
+            if key in self._derived:
+                return self._derived[key]
+            view = self._derived[key] = compute()
+            self.nbytes += approximate_nbytes(view)
+        if self.on_resize is not None:
+            self.on_resize(self)
+        return view
+
+    def main_data(self):
+        """The dashboard data decoded from main_json, for the exports"""
+        return json.loads(self.main_json)
+
+    def athlete_daily(self):
+        """Athlete x day points per activity type, see compute_athlete_daily"""
+        history = self.team_history
+        return self.derived('athlete_daily', lambda: compute_athlete_daily(
+            self.source, history.start, history.end))
+
+    def rechecked(self, loaded_at, source_checked_at, team_checked_at):
+        """Copy of this snapshot for a refresh that found both sheets unchanged"""
+        snapshot = copy.copy(self)
+        snapshot.loaded_at = loaded_at
+        snapshot.created = time.monotonic()
+        snapshot.source_checked_at = source_checked_at
+        snapshot.team_checked_at = team_checked_at
+        return snapshot
+
+
+def sheet_fingerprint(df):
+    """Content hash of a fetched worksheet, header row included"""
+    digest = hashlib.sha1('\x1f'.join(map(str, df.columns)).encode())
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(
+            df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def build_snapshot(challenge, version, previous=None):
+    """
+    Fetch the sheets of a challenge and prepare everything it serves
+
+    Each worksheet is only fetched when its refresh interval has passed
+    since previous checked it. A fetched sheet whose fingerprint matches
+    previous is not processed again: unchanged SOURCE keeps the normalized
+    rows, cumulative arrays and derived views, unchanged TEAM DATA keeps
+    the gender map, and when neither changed previous is kept as is.
+    """
+    creds = load_service_account_credentials()
+    if not creds:
+        raise SnapshotError('No credentials available')
+
+    now = time.monotonic()
+    source_due = previous is None or \
+        now - previous.source_checked_at >= challenge.source_refresh_seconds
+    team_due = previous is None or \
+        now - previous.team_checked_at >= challenge.team_data_refresh_seconds
+
+    source_changed = team_changed = False
+    if source_due:
+        raw_source_df = read_google_sheet(challenge, creds, 'SOURCE')
+        if raw_source_df.empty:
+            raise SnapshotError('SOURCE sheet is empty')
+        source_version = sheet_fingerprint(raw_source_df)
+        source_changed = previous is None or \
+            source_version != previous.source_version
+    if team_due:
+        team_data_df = read_google_sheet(challenge, creds, 'TEAM DATA')
+        team_version = sheet_fingerprint(team_data_df)
+        team_changed = previous is None or \
+            team_version != previous.team_version
+        if team_changed and team_data_df.empty:
             logger.warning(
                 "TEAM DATA sheet is empty - gender detection may be inaccurate")
 
-        results = compute_main_data(source_df, team_data_df)
-        tz = pytz.timezone(TIMEZONE)
+    tz = pytz.timezone(TIMEZONE)
+    today = datetime.now(tz).date()
+    source_checked_at = now if source_due else previous.source_checked_at
+    team_checked_at = now if team_due else previous.team_checked_at
+
+    if not source_changed and not team_changed and \
+            previous.team_history.end == today:
+        logger.info(f"Sheets unchanged for {challenge.slug}, keeping snapshot")
+        return previous.rechecked(datetime.now(tz), source_checked_at,
+                                  team_checked_at)
+
+    if source_changed:
+        source_df = normalize_source(raw_source_df)
+    else:
+        source_df, source_version = previous.source, previous.source_version
+    if team_changed:
+        gender_map = create_gender_map(team_data_df)
+    else:
+        gender_map, team_version = previous.gender_map, previous.team_version
+
+    if source_changed or previous.team_history.end != today:
+        valid_df = valid_team_rows(source_df)
+        team_history = build_cumulative_points(
+            valid_df, 'team', challenge.start_date, today)
+        athlete_history = build_cumulative_points(
+            valid_df, 'athlete_id', challenge.start_date, today)
+        derived = {}
+    else:
+        team_history = previous.team_history
+        athlete_history = previous.athlete_history
+        derived = dict(previous._derived)
+    if 'athlete_daily' not in derived:
+        derived['athlete_daily'] = compute_athlete_daily(
+            source_df, team_history.start, team_history.end)
+
+    main_data = compute_main_data(source_df, gender_map)
+    annotate_rank_changes(main_data, team_history, derived['athlete_daily'],
+                          today - timedelta(days=RANK_CHANGE_DAYS), tz)
+
+    return Snapshot(version, source_df, gender_map, main_data, team_history,
+                    athlete_history, datetime.now(tz), source_version,
+                    team_version, source_checked_at, team_checked_at, derived)
+
+
+class SnapshotStore:
+    """
+    Holds the current Snapshot and refreshes it off the request path
+
+    The first request in a process waits for the initial load. After that
+    requests are always answered from the snapshot in memory; once it is
+    older than max_age a single background thread fetches the sheets again
+    and swaps the new snapshot in (stale-while-revalidate). When a refresh
+    fails the last good snapshot keeps being served and staleness() says so,
+    and no new attempt is made for retry_seconds; a failed initial load
+    raises SheetsUnavailable until then without calling the builder.
+
+    on_load, when set, is called with every snapshot that is swapped in,
+    and again whenever that snapshot grows by a derived view.
+    """
+
+    def __init__(self, builder, max_age, retry_seconds):
+        self._builder = builder
+        self._max_age = max_age
+        self._retry_seconds = retry_seconds
+        self._retry_at = 0.0
+        self.on_load = None
+        self._snapshot = None
+        self._version = 0
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._last_error = None
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self._load_initial()
+        now = time.monotonic()
+        if now - snapshot.created >= self._max_age and now >= self._retry_at:
+            self._refresh_in_background()
+        return snapshot
+
+    @property
+    def loaded(self):
+        return self._snapshot
+
+    def evict(self):
+        """Drop the prepared data; the next get() loads it again"""
+        self._snapshot = None
+
+    def discard_expired(self):
+        """Evict the snapshot if it is older than max_age"""
+        snapshot = self._snapshot
+        if snapshot is not None and \
+                time.monotonic() - snapshot.created >= self._max_age:
+            self.evict()
+
+    def _load_initial(self):
+        with self._load_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                if self._last_error is not None and \
+                        time.monotonic() < self._retry_at:
+                    raise SheetsUnavailable(self._last_error)
+                snapshot = self._snapshot = self._build()
+                self._loaded(snapshot)
+            return snapshot
+
+    def _loaded(self, snapshot):
+        if self.on_load is not None:
+            self.on_load(snapshot)
+
+    def staleness(self):
+        """Whether the snapshot being served missed its last refresh"""
+        error = self._last_error
+        return {'stale': error is not None, 'stale_reason': error}
+
+    def _build(self):
+        try:
+            snapshot = self._builder(self._version + 1, self._snapshot)
+        except Exception as e:
+            self._last_error = str(e)
+            self._retry_at = time.monotonic() + self._retry_seconds
+            raise
+        self._version = snapshot.version
+        self._last_error = None
+        snapshot.on_resize = self._loaded
+        return snapshot
+
+    def _refresh_in_background(self):
+        with self._load_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='snapshot-refresh',
+                         daemon=True).start()
+
+    def _refresh(self):
+        try:
+            snapshot = self._build()
+            self._snapshot = snapshot
+            logger.info(f"Snapshot {snapshot.version} loaded")
+            self._loaded(snapshot)
+        except SheetsUnavailable as e:
+            logger.warning(f"Snapshot refresh failed, serving stale data: {e}")
+        except Exception as e:
+            logger.exception("Snapshot refresh failed: %s", e)
+        finally:
+            self._refreshing = False
+
+
+class Challenge:
+    """One hosted challenge: its sheet, window, refresh schedule and state"""
+
+    def __init__(self, slug, title, sheet_id, start_date, refresh_seconds,
+                 team_data_refresh_seconds):
+        self.slug = slug
+        self.title = title
+        self.start_date = start_date
+        self.sheets = SheetsClient(
+            sheet_id,
+            budget=sheets_budget,
+            max_retries=SHEETS_MAX_RETRIES,
+            backoff_base=SHEETS_BACKOFF_BASE_SECONDS,
+            backoff_max=SHEETS_BACKOFF_MAX_SECONDS,
+            failure_threshold=SHEETS_CIRCUIT_FAILURES,
+            reset_seconds=SHEETS_CIRCUIT_RESET_SECONDS)
+        self.source_refresh_seconds = refresh_seconds
+        self.team_data_refresh_seconds = team_data_refresh_seconds
+        self.store = SnapshotStore(
+            lambda version, previous: build_snapshot(self, version, previous),
+            min(refresh_seconds, team_data_refresh_seconds),
+            SNAPSHOT_RETRY_SECONDS)
+
+    @property
+    def base_url(self):
+        return '' if self.slug == DEFAULT_CHALLENGE else f"/c/{self.slug}"
+
+
+class ChallengeRegistry:
+    """
+    The challenges served by this process, with an LRU over their snapshots
+
+    Whenever a snapshot is loaded or stores a derived view the approximate
+    size of all prepared snapshots is checked against memory_limit and the
+    least recently used challenges are evicted until it fits. An evicted
+    challenge keeps its configuration and reloads lazily on its next
+    request.
+    """
+
+    def __init__(self, challenges, memory_limit):
+        self._challenges = {c.slug: c for c in challenges}
+        self.memory_limit = memory_limit
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        for challenge in challenges:
+            challenge.store.on_load = \
+                lambda snapshot, c=challenge: self._loaded(c)
+
+    def get(self, slug):
+        challenge = self._challenges.get(slug)
+        if challenge is not None:
+            with self._lock:
+                if slug in self._lru:
+                    self._lru.move_to_end(slug)
+        return challenge
+
+    def __iter__(self):
+        return iter(self._challenges.values())
+
+    def _loaded(self, challenge):
+        with self._lock:
+            self._lru[challenge.slug] = challenge
+            self._lru.move_to_end(challenge.slug)
+            total = sum(c.store.loaded.nbytes for c in self._lru.values()
+                        if c.store.loaded is not None)
+            while total > self.memory_limit and len(self._lru) > 1:
+                slug, cold = self._lru.popitem(last=False)
+                if cold.store.loaded is not None:
+                    total -= cold.store.loaded.nbytes
+                cold.store.evict()
+                logger.info(f"Evicted snapshot of challenge {slug}")
+
+
+def load_challenges():
+    """
+    The default challenge from SHEET_ID / START_DATE plus any extra ones
+
+    Extra challenges come from the CHALLENGES_JSON environment variable or
+    a challenges.json file, mapping a slug to its settings:
+
+        {"summer": {"title": "GEF Summer Challenge", "sheet_id": "...",
+                    "start_date": "2026-05-01", "refresh_seconds": 120,
+                    "team_data_refresh_seconds": 3600}}
+    """
+    challenges = [Challenge(DEFAULT_CHALLENGE, 'GEF Winter Challenge',
+                            SHEET_ID, START_DATE, SNAPSHOT_MAX_AGE_SECONDS,
+                            TEAM_DATA_REFRESH_SECONDS)]
+    config = {}
+    try:
+        json_str = os.environ.get('CHALLENGES_JSON')
+        if json_str:
+            config = json.loads(json_str)
+        elif os.path.exists('challenges.json'):
+            with open('challenges.json', 'r', encoding='utf-8') as f:
+                config = json.load(f)
+    except Exception as e:
+        logger.exception("Error loading challenges: %s", e)
+
+    for slug, settings in config.items():
+        if slug == DEFAULT_CHALLENGE:
+            continue
+        challenges.append(Challenge(
+            slug,
+            settings.get('title', slug),
+            settings['sheet_id'],
+            date.fromisoformat(settings['start_date']),
+            int(settings.get('refresh_seconds', SNAPSHOT_MAX_AGE_SECONDS)),
+            int(settings.get('team_data_refresh_seconds',
+                             TEAM_DATA_REFRESH_SECONDS))))
+    logger.info(f"Serving challenges: {[c.slug for c in challenges]}")
+    return challenges
+
+
+challenges = ChallengeRegistry(load_challenges(),
+                               SNAPSHOT_MEMORY_LIMIT_MB * 1024 * 1024)
+
+
+def preload():
+    """
+    Warm the default challenge in the gunicorn master (preload_app)
+
+    Called from gunicorn.conf.py before the workers are forked, so every
+    worker starts with the snapshot in memory and shares its pages
+    copy-on-write instead of fetching the sheets on its first request.
+    Nothing here starts a thread: refreshes are spawned later by each
+    worker's own requests. gc.freeze() moves everything allocated so far
+    out of the collected generations, so collections in the workers do
+    not write to those pages.
+    """
+    try:
+        snapshot = challenges.get(DEFAULT_CHALLENGE).store.get()
+        logger.info(f"Preloaded snapshot {snapshot.version} of "
+                    f"{DEFAULT_CHALLENGE}")
+    except Exception as e:
+        logger.warning(f"Preloading failed, workers will load on demand: {e}")
+    gc.freeze()
+
+
+def reset_after_fork():
+    """
+    Forked workers must not share the master's pooled Sheets sockets, and
+    a worker respawned long after preload() must not serve the master's
+    old snapshot as fresh: it loads its own instead
+    """
+    for challenge in challenges:
+        challenge.sheets.reset_connection()
+        challenge.store.discard_expired()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+dashboard = Blueprint('dashboard', __name__)
+
+
+@dashboard.url_value_preprocessor
+def pull_challenge(endpoint, values):
+    slug = (values or {}).pop('challenge', DEFAULT_CHALLENGE)
+    g.challenge = challenges.get(slug)
+    if g.challenge is None:
+        abort(404)
+
+
+def conditional_json(payload, version, encoded=None):
+    """
+    JSON response with a weak ETag for version that answers a matching
+    If-None-Match with 304, so revalidation does not resend the body
+
+    encoded, when given, is a non-empty JSON object already serialized to
+    bytes; its members are sent followed by those of payload.
+    """
+    if payload.get('stale'):
+        version += '-stale'
+    if encoded is None:
+        response = jsonify(payload)
+    else:
+        response = Response(
+            encoded[:-1] + b',' + json.dumps(payload).encode()[1:],
+            mimetype='application/json')
+    response.set_etag(version, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@dashboard.route('/sw.js')
+def service_worker():
+    response = Response(SERVICE_WORKER_JS, mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@dashboard.route('/')
+def index():
+    return render_template_string(MAIN_TEMPLATE, title=g.challenge.title,
+                                  base=g.challenge.base_url)
+
+
+@dashboard.route('/api/data')
+def api_data():
+    try:
+        snapshot = g.challenge.store.get()
+        # athletes, teams, leaderboards, sheet_updated and rank_baseline_at
+        # come pre-encoded in main_json
         payload = {
-            'athletes': results['athletes'],
-            'teams': results['teams'],
-            'leaderboards': results['leaderboards'],
-            'sheet_updated': results['sheet_updated'],
-            'loaded_at': datetime.now(tz).isoformat()
+            'version': snapshot.data_version,
+            'loaded_at': snapshot.loaded_at.isoformat(),
+            **g.challenge.store.staleness()
         }
-        return jsonify(payload)
+        return conditional_json(payload, snapshot.data_version,
+                                snapshot.main_json)
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.exception("Failed to build API data: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/team/<team_id>')
+@dashboard.route('/team/<team_id>')
 def team_detail(team_id):
     try:
-        creds = load_service_account_credentials()
-        if not creds:
-            return "No credentials available", 500
-
-        source_df = read_google_sheet(creds, 'SOURCE')
-        if source_df.empty:
-            return "No data available", 500
-
-        members = compute_team_details(source_df, team_id)
+        snapshot = g.challenge.store.get()
+        members = compute_team_details(snapshot.source, team_id)
         total_points = sum(float(m['total_points']) for m in members)
-        tz = pytz.timezone(TIMEZONE)
-        updated_at = datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S')
+        updated_at = snapshot.loaded_at.strftime('%Y-%m-%d %H:%M:%S')
 
         return render_template_string(
             TEAM_TEMPLATE,
@@ -959,30 +2216,206 @@ def team_detail(team_id):
             members=members,
             member_count=len(members),
             total_points=f"{total_points:.1f}",
-            updated_at=updated_at
+            updated_at=updated_at,
+            base=g.challenge.base_url,
+            **g.challenge.store.staleness()
         )
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return f"Error: {str(e)}", 503
     except Exception as e:
         logger.exception("Failed to load team details: %s", e)
         return f"Error: {str(e)}", 500
 
 
-@app.route('/api/athlete/<athlete_id>')
+@dashboard.route('/api/athlete/<athlete_id>')
 def athlete_activities(athlete_id):
+    """
+    Daily activity of one athlete; ?format=columnar returns the compact
+    parallel-array form, optionally ?dense=1 and windowed by ?from=&to=
+    """
     try:
-        creds = load_service_account_credentials()
-        if not creds:
-            return jsonify({'error': 'No credentials available'}), 500
+        snapshot = g.challenge.store.get()
+        if request.args.get('format') == 'columnar':
+            history = snapshot.team_history
+            try:
+                first, last, _ = parse_history_window(request.args, history)
+            except ValueError:
+                return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+            dense = request.args.get('dense', '').lower() in (
+                '1', 'true', 'yes')
+            result = compute_athlete_columnar(
+                snapshot.athlete_daily(), athlete_id, history.start, first,
+                last, dense)
+            # The window ends on the day the snapshot was built for
+            last_day = history.end
+        else:
+            result = compute_athlete_activities(
+                snapshot.source, athlete_id, g.challenge.start_date)
+            # Legacy payloads list every day up to today
+            last_day = datetime.now(pytz.timezone(TIMEZONE)).date()
+        result.update(g.challenge.store.staleness())
+        return conditional_json(
+            result, f"{snapshot.source_version}-{last_day.isoformat()}")
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.exception("Failed to load athlete activities: %s", e)
+        return jsonify({'error': str(e)}), 500
 
-        source_df = read_google_sheet(creds, 'SOURCE')
-        if source_df.empty:
-            return jsonify({'error': 'No data available'}), 500
 
-        result = compute_athlete_activities(source_df, athlete_id)
+@dashboard.route('/api/teams/history')
+def teams_history():
+    """Team totals and ranks as of ?date=, or as series over ?from=&to="""
+    try:
+        snapshot = g.challenge.store.get()
+        history = snapshot.team_history
+        try:
+            first, last, single = parse_history_window(request.args, history)
+        except ValueError:
+            return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+        if single:
+            teams = [{'team': team,
+                      'points': round(float(history.cumsum[i, first]), 1),
+                      'rank': int(history.ranks[i, first])}
+                     for i, team in enumerate(history.keys)]
+            teams.sort(key=lambda t: t['rank'])
+            result = {'date': history.date_labels(first, first)[0],
+                      'teams': teams}
+        else:
+            result = {
+                'dates': history.date_labels(first, last),
+                'teams': [{'team': team,
+                           'points': np.round(
+                               history.cumsum[i, first:last + 1], 1).tolist(),
+                           'ranks': history.ranks[i, first:last + 1].tolist()}
+                          for i, team in enumerate(history.keys)]
+            }
+        result.update(g.challenge.store.staleness())
         return jsonify(result)
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        logger.exception("Failed to load athlete activities: %s", e)
+        logger.exception("Failed to load team history: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard.route('/api/athlete/<athlete_id>/history')
+def athlete_history(athlete_id):
+    """Athlete total and overall rank as of ?date=, or over ?from=&to="""
+    try:
+        snapshot = g.challenge.store.get()
+        history = snapshot.athlete_history
+        i = history.index.get(athlete_id)
+        if i is None:
+            return jsonify({'error': 'Athlete not found'}), 404
+        try:
+            first, last, single = parse_history_window(request.args, history)
+        except ValueError:
+            return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+        if single:
+            result = {'athlete_id': athlete_id,
+                      'date': history.date_labels(first, first)[0],
+                      'points': round(float(history.cumsum[i, first]), 1),
+                      'rank': int(history.ranks[i, first])}
+        else:
+            result = {'athlete_id': athlete_id,
+                      'dates': history.date_labels(first, last),
+                      'points': np.round(
+                          history.cumsum[i, first:last + 1], 1).tolist(),
+                      'ranks': history.ranks[i, first:last + 1].tolist()}
+        result.update(g.challenge.store.staleness())
+        return jsonify(result)
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.exception("Failed to load athlete history: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@dashboard.route('/api/heatmap')
+def team_heatmap():
+    """Team x day points, split into run/walk/ride with ?split=1"""
+    try:
+        snapshot = g.challenge.store.get()
+        split = request.args.get('split', '').lower() in ('1', 'true', 'yes')
+        history = snapshot.team_history
+        result = dict(snapshot.derived(
+            ('heatmap', split),
+            lambda: compute_team_heatmap(snapshot.source, history.start,
+                                         history.end, split)))
+        result.update(g.challenge.store.staleness())
+        return jsonify(result)
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.exception("Failed to build heatmap: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
+@dashboard.route('/export/leaderboards.csv')
+def export_leaderboards():
+    try:
+        snapshot = g.challenge.store.get()
+        rows = leaderboard_rows(snapshot.main_data())
+        return export_response(stream_csv(rows), 'leaderboards.csv',
+                               'text/csv')
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return f"Error: {str(e)}", 503
+    except Exception as e:
+        logger.exception("Failed to export leaderboards: %s", e)
+        return f"Error: {str(e)}", 500
+
+
+@dashboard.route('/export/teams.csv')
+def export_teams():
+    try:
+        snapshot = g.challenge.store.get()
+        return export_response(stream_csv(team_rows(snapshot.main_data())),
+                               'teams.csv', 'text/csv')
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return f"Error: {str(e)}", 503
+    except Exception as e:
+        logger.exception("Failed to export teams: %s", e)
+        return f"Error: {str(e)}", 500
+
+
+@dashboard.route('/export/activities.xlsx')
+def export_activities():
+    """Athlete x day activity matrix, limited to one team with ?team="""
+    try:
+        snapshot = g.challenge.store.get()
+        team = request.args.get('team') or None
+        if team is not None and team not in snapshot.team_history.index:
+            return "Team not found", 404
+
+        history = snapshot.team_history
+        daily = snapshot.athlete_daily()
+        filename = f"activities-{team}.xlsx" if team else 'activities.xlsx'
+        return export_response(
+            stream_xlsx(activity_rows(daily, history.start, team),
+                        'Activities'),
+            filename, XLSX_MIMETYPE)
+    except SheetsUnavailable as e:
+        logger.warning(f"No snapshot to serve: {e}")
+        return f"Error: {str(e)}", 503
+    except Exception as e:
+        logger.exception("Failed to export activities: %s", e)
+        return f"Error: {str(e)}", 500
+
+
+app.register_blueprint(dashboard)
+app.register_blueprint(dashboard, url_prefix='/c/<challenge>',
+                       name='challenge')
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True)
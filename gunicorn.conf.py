@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the dashboard
+
+Routes answer from the in-memory snapshot and the Google Sheets fetch runs
+in a background thread, so a request never waits on the Sheets API once the
+process is warm. The gthread worker class lets each worker process serve
+many such requests at once: concurrency is workers * threads and is bounded
+by memory (one prepared snapshot per worker process), not by the number of
+processes.
+
+With preload_app the master imports the app and loads the default
+challenge's snapshot before forking, so workers start warm and share that
+memory copy-on-write until their first refresh replaces it. Set
+GUNICORN_PRELOAD=0 to have each worker load on its own.
+
+Command line flags (e.g. `-w 4`) override these values.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+# Idle keep-alive connections hold a thread, not a whole worker
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in (
+    '1', 'true', 'yes')
+
+
+def on_starting(server):
+    # Runs in the master after preload_app imported the app, before fork
+    if server.cfg.preload_app:
+        from app import preload
+        preload()
+
+
+def post_worker_init(worker):
+    # The Sheets request budget is kept per process
+    from app import split_budget
+    split_budget(worker.cfg.workers)
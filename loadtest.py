@@ -0,0 +1,244 @@
+"""
+Offline load test for the dashboard
+
+Starts the Sheets API stand-in from sheets_stub.py, then runs `app:app`
+under gunicorn once per worker / thread setting, pointed at the stand-in
+through SHEETS_API_URL, and replays a weighted mix of user traffic:
+
+    poll     dashboard polling /api/data (revalidating with If-None-Match)
+    page     a fresh page load, / followed by /api/data
+    team     a click through to /team/<team>
+    athlete  an athlete search, /api/athlete/<id>?format=columnar
+
+Throughput and p50 / p95 / p99 latency are printed per route for each
+setting. No network access or credentials are needed:
+
+    python loadtest.py --workers 1 2 4 --threads 1 8 32 --clients 64
+    python loadtest.py --mix poll=80,team=10,athlete=10 --rate-limit 0.1
+    python loadtest.py --preload on off
+
+A thread count of 1 runs the sync worker, anything else runs gthread.
+The repo's gunicorn.conf.py is always used, whatever the current
+directory, with preload_app pinned by --preload.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import itertools
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+import sheets_stub
+
+DEFAULT_MIX = 'poll=60,page=10,team=15,athlete=15'
+ROUTES = ['/', '/api/data', '/team/<team>', '/api/athlete/<id>']
+
+
+def parse_mix(text):
+    """Parse 'poll=70,team=15,athlete=15' into {scenario: weight}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f"unknown scenario {name!r}, expected one of "
+                f"{', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _fetch(url, etag=None):
+    """GET url; returns (ok, seconds, etag) and treats 304 as success"""
+    req = urllib.request.Request(url)
+    if etag:
+        req.add_header('If-None-Match', etag)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as res:
+            res.read()
+            ok = res.status == 200
+            etag = res.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        ok = e.code == 304
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return ok, time.perf_counter() - start, etag
+
+
+def _poll(client):
+    client.get('/api/data', '/api/data', revalidate=True)
+
+
+def _page(client):
+    client.get('/', '/')
+    client.get('/api/data', '/api/data')
+
+
+def _team(client):
+    team = client.rng.choice(client.teams)
+    client.get(f"/team/{team}", '/team/<team>')
+
+
+def _athlete(client):
+    athlete_id = client.rng.choice(client.athlete_ids)
+    client.get(f"/api/athlete/{athlete_id}?format=columnar",
+               '/api/athlete/<id>')
+
+
+SCENARIOS = {'poll': _poll, 'page': _page, 'team': _team, 'athlete': _athlete}
+
+
+class Client:
+    """One simulated user; records (route, ok, seconds) into results"""
+
+    def __init__(self, base, teams, athlete_ids, results, lock, seed):
+        self.base = base
+        self.teams = teams
+        self.athlete_ids = athlete_ids
+        self.results = results
+        self.lock = lock
+        self.rng = random.Random(seed)
+        self.etag = None
+
+    def get(self, path, route, revalidate=False):
+        ok, elapsed, etag = _fetch(self.base + path,
+                                   self.etag if revalidate else None)
+        if revalidate and etag:
+            self.etag = etag
+        with self.lock:
+            self.results.append((route, ok, elapsed))
+
+
+def run_clients(base, mix, teams, athlete_ids, clients, duration):
+    """Replay the traffic mix from `clients` threads for `duration` seconds"""
+    results = []
+    lock = threading.Lock()
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    stop_at = time.monotonic() + duration
+
+    def run(seed):
+        client = Client(base, teams, athlete_ids, results, lock, seed)
+        while time.monotonic() < stop_at:
+            SCENARIOS[client.rng.choices(names, weights)[0]](client)
+
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def summarize(results, duration):
+    """Rows of (route, req/s, p50, p95, p99, errors), with an 'all' total"""
+    def row(route, samples):
+        latencies = sorted(s for _, ok, s in samples if ok)
+        errors = sum(1 for _, ok, _ in samples if not ok)
+
+        def pct(p):
+            if not latencies:
+                return float('nan')
+            return latencies[min(len(latencies) - 1,
+                                 int(len(latencies) * p))] * 1000
+
+        return (route, len(latencies) / duration, pct(0.5), pct(0.95),
+                pct(0.99), errors)
+
+    rows = [row(route, [r for r in results if r[0] == route])
+            for route in ROUTES if any(r[0] == route for r in results)]
+    rows.append(row('all', results))
+    return rows
+
+
+def _wait_ready(base, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        if _fetch(base + '/api/data')[0]:
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 32])
+    parser.add_argument('--preload', nargs='+', default=['on'],
+                        choices=['on', 'off'])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--stub-port', type=int, default=8900)
+    parser.add_argument('--refresh', default='10',
+                        help='SNAPSHOT_MAX_AGE_SECONDS for the app, so every '
+                             'run also pays for Sheets I/O')
+    sheets_stub.add_arguments(parser)
+    args = parser.parse_args()
+
+    stub = sheets_stub.stub_from_args(args)
+    stub.start(port=args.stub_port, update_every=args.update_every)
+    source = stub.sheets['SOURCE'][1:]
+    teams = sorted({row[7] for row in source})
+    athlete_ids = sorted({row[8] for row in source})
+
+    base = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ,
+               SHEETS_API_URL=f"http://127.0.0.1:{args.stub_port}",
+               SHEET_ID='loadtest',
+               SNAPSHOT_MAX_AGE_SECONDS=args.refresh)
+    env.pop('GOOGLE_SHEETS_CREDENTIALS_JSON', None)
+    env.pop('CHALLENGES_JSON', None)
+    # Run from an empty directory so a local credentials.json or
+    # challenges.json can't send the app anywhere but the stand-in
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    repo = os.path.dirname(os.path.abspath(__file__))
+    config = os.path.join(repo, 'gunicorn.conf.py')
+
+    reports = []
+    for preload, workers, threads in itertools.product(
+            args.preload, args.workers, args.threads):
+        name = f"{workers}w x {threads}t, preload {preload}"
+        worker = (['-k', 'sync'] if threads == 1 else
+                  ['-k', 'gthread', '--threads', str(threads)])
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', config,
+               '-b', f"127.0.0.1:{args.port}", '-w', str(workers),
+               '--chdir', workdir, '--pythonpath', repo,
+               '--log-level', 'warning'] + worker + ['app:app']
+        before = dict(stub.stats)
+        server = subprocess.Popen(cmd, env=dict(
+            env, GUNICORN_PRELOAD='1' if preload == 'on' else '0'))
+        try:
+            if not _wait_ready(base, server):
+                print(f"{name}: server did not become ready",
+                      file=sys.stderr)
+                continue
+            results = run_clients(base, args.mix, teams, athlete_ids,
+                                  args.clients, args.duration)
+            sheets = {k: stub.stats[k] - before[k] for k in before}
+            reports.append((name, summarize(results, args.duration), sheets))
+        finally:
+            server.terminate()
+            server.wait()
+
+    for name, rows, sheets in reports:
+        print(f"\n{name}  (Sheets calls {sheets['requests']}, "
+              f"429s {sheets['throttled']}, 5xx {sheets['failed']})")
+        print(f"{'route':<20} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'errors':>7}")
+        for route, rate, p50, p95, p99, errors in rows:
+            print(f"{route:<20} {rate:>9.1f} {p50:>9.1f} {p95:>9.1f} "
+                  f"{p99:>9.1f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Offline stand-in for the Google Sheets API
+
+Serves generated SOURCE and TEAM DATA worksheets in the shape gspread
+expects (spreadsheet metadata and values), with optional latency, 429
+quota errors and 5xx failures, so the dashboard can be run and load
+tested without network access:
+
+    python sheets_stub.py --port 8900 --latency 0.3 --rate-limit 0.05
+    SHEETS_API_URL=http://127.0.0.1:8900 gunicorn app:app
+
+Only the two GET endpoints the dashboard uses are implemented.
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+SOURCE_HEADER = ['Athlete', 'Name', 'Day', 'Run', 'Walk', 'ride', 'Total',
+                 'Team', 'ID']
+TEAM_DATA_HEADER = ['TEAM', 'NAME', 'EMAIL', 'STRAVA_ID', 'OFFICE', 'ROLE',
+                    'GENDER']
+
+
+def generate_sheets(start, teams=12, athletes_per_team=25, end=None, seed=7):
+    """
+    Generate SOURCE and TEAM DATA rows shaped like the real sheets
+
+    Every athlete logs something on about 60% of the days from start to
+    end (today by default). Returns {'SOURCE': rows, 'TEAM DATA': rows}
+    with the header as the first row and every cell a string.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    days = max((end - start).days + 1, 1)
+    source = [list(SOURCE_HEADER)]
+    team_data = [list(TEAM_DATA_HEADER)]
+    for t in range(teams):
+        team = f"T{t + 1:02d}"
+        for a in range(athletes_per_team):
+            athlete_id = str(100000 + t * 1000 + a)
+            name = f"Athlete {team}-{a + 1:03d}"
+            gender = rng.choice(['M', 'M', 'F', 'Sr_M', 'Sr_F'])
+            team_data.append([team, name, f"{athlete_id}@example.com",
+                              athlete_id, 'HQ', 'Member', gender])
+            for d in range(days):
+                if rng.random() < 0.4:
+                    continue
+                run = round(rng.random() * 5, 1) if rng.random() < 0.5 else 0
+                walk = round(rng.random() * 3, 1) if rng.random() < 0.5 else 0
+                ride = round(rng.random() * 8, 1) if rng.random() < 0.3 else 0
+                day = start + timedelta(days=d)
+                source.append([f"/athletes/{athlete_id}", name,
+                               day.strftime('%Y-%m-%d'), str(run), str(walk),
+                               str(ride), str(round(run + walk + ride, 1)),
+                               team, athlete_id])
+    return {'SOURCE': source, 'TEAM DATA': team_data}
+
+
+class SheetsStub:
+    """
+    Thread-safe holder of the fake worksheets and the fault settings
+
+    latency + uniform(0, jitter) seconds is added to every request; then a
+    request fails with 429 with probability rate_limit, or with 500 with
+    probability error_rate. touch_source() edits one SOURCE cell so the
+    next fetch sees new content, as when athletes sync during the day.
+    """
+
+    def __init__(self, sheets, latency=0.0, jitter=0.0, rate_limit=0.0,
+                 error_rate=0.0, seed=None):
+        self.sheets = sheets
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'failed': 0}
+
+    def touch_source(self):
+        with self._lock:
+            rows = self.sheets['SOURCE']
+            if len(rows) > 1:
+                row = self._rng.randrange(1, len(rows))
+                rows[row] = list(rows[row])
+                rows[row][6] = str(round(float(rows[row][6]) + 0.1, 1))
+
+    def outcome(self):
+        """Status code to answer with, after sleeping the injected latency"""
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            roll = self._rng.random()
+            if roll < self.rate_limit:
+                status = 429
+                self.stats['throttled'] += 1
+            elif roll < self.rate_limit + self.error_rate:
+                status = 500
+                self.stats['failed'] += 1
+            else:
+                status = 200
+        if delay:
+            time.sleep(delay)
+        return status
+
+    def metadata(self, spreadsheet_id):
+        with self._lock:
+            sheets = [{'properties': {
+                'sheetId': i, 'title': title, 'index': i,
+                'sheetType': 'GRID',
+                'gridProperties': {'rowCount': len(rows),
+                                   'columnCount': len(rows[0]) if rows else 0}}}
+                for i, (title, rows) in enumerate(self.sheets.items())]
+        return {'spreadsheetId': spreadsheet_id,
+                'properties': {'title': 'Sheets stand-in', 'locale': 'en_US',
+                               'timeZone': 'Etc/GMT'},
+                'sheets': sheets}
+
+    def values(self, range_name):
+        title = range_name.split('!')[0].strip("'")
+        with self._lock:
+            rows = self.sheets.get(title)
+            rows = list(rows) if rows is not None else None
+        if rows is None:
+            return None
+        return {'range': f"'{title}'!A1", 'majorDimension': 'ROWS',
+                'values': rows}
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                match = re.fullmatch(r'/v4/spreadsheets/([^/]+)(?:/values/(.+))?',
+                                     urlparse(self.path).path)
+                if not match:
+                    return self.reply(404, {'error': {
+                        'code': 404, 'message': 'Not found',
+                        'status': 'NOT_FOUND'}})
+                status = stub.outcome()
+                if status == 429:
+                    return self.reply(429, {'error': {
+                        'code': 429, 'message': 'Quota exceeded',
+                        'status': 'RESOURCE_EXHAUSTED'}})
+                if status == 500:
+                    return self.reply(500, {'error': {
+                        'code': 500, 'message': 'Internal error',
+                        'status': 'INTERNAL'}})
+
+                spreadsheet_id, range_name = match.groups()
+                if range_name is None:
+                    return self.reply(200, stub.metadata(spreadsheet_id))
+                body = stub.values(unquote(range_name))
+                if body is None:
+                    return self.reply(400, {'error': {
+                        'code': 400, 'message': 'Unable to parse range',
+                        'status': 'INVALID_ARGUMENT'}})
+                return self.reply(200, body)
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host='127.0.0.1', port=8900, update_every=0):
+        """Serve from a background thread; returns the HTTP server"""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        if update_every:
+            def update():
+                while True:
+                    time.sleep(update_every)
+                    self.touch_source()
+            threading.Thread(target=update, daemon=True).start()
+        return server
+
+
+def add_arguments(parser):
+    """Options shared with loadtest.py"""
+    parser.add_argument('--start-date', type=date.fromisoformat,
+                        default=date(2025, 11, 16))
+    parser.add_argument('--teams', type=int, default=12)
+    parser.add_argument('--athletes-per-team', type=int, default=25)
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='seconds added to every Sheets call')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help='extra random latency, up to this many seconds')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='fraction of calls answered with 429')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with 500')
+    parser.add_argument('--update-every', type=float, default=30,
+                        help='seconds between SOURCE edits, 0 to never edit')
+
+
+def stub_from_args(args):
+    sheets = generate_sheets(args.start_date, args.teams,
+                             args.athletes_per_team)
+    return SheetsStub(sheets, latency=args.latency, jitter=args.jitter,
+                      rate_limit=args.rate_limit, error_rate=args.error_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    stub = stub_from_args(args)
+    stub.start(args.host, args.port, args.update_every)
+    print(f"Sheets stand-in on http://{args.host}:{args.port} "
+          f"({len(stub.sheets['SOURCE']) - 1} SOURCE rows)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()